@@ -1,52 +1,252 @@
 import json
+import logging
 import os
+import threading
+import time
 from datetime import datetime
 from tinydb import TinyDB, Query
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from tinydb.table import Document
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash, stream_with_context
+from change_log import ChangeLog
+from index_cache import file_checksum, load_index_cache, save_index_cache
+from snapshots import SnapshotStore
+from spatial_index import SpatialIndex, load_commune_centroids, parse_coordinates
+from stats_cube import StatsCube
+from suggest_index import SuggestIndex
+from utils import content_hash, fold_text
 
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this-in-production'
 
-# Create necessary directories
-os.makedirs('templates', exist_ok=True)
-os.makedirs('static/css', exist_ok=True)
-os.makedirs('static/js', exist_ok=True)
-os.makedirs('data', exist_ok=True)
+# TinyDB database, opened lazily on first use
+DB_PATH = 'moroccan_hospitals.json'
 
-# Initialize TinyDB database
-db = TinyDB('moroccan_hospitals.json')
-hospitals_table = db.table('hospitals')
+# Pickled indexes, reused at startup while DB_PATH's checksum is unchanged
+INDEX_CACHE_PATH = 'data/.hospitals_index.cache'
+
+# Writes are batched into at most one index cache refresh per this many seconds
+INDEX_CACHE_SAVE_DELAY_SECONDS = 5
+
+# Offline commune centroids used to backfill missing coordinates
+COMMUNE_CENTROIDS_PATH = 'data/commune_centroids.json'
+
+# Point-in-time copies of the hospitals table
+SNAPSHOTS_DIR = 'data/snapshots'
+
+# Bookkeeping fields that do not count as a content change on import
+TIMESTAMP_FIELDS = ('created_at', 'updated_at')
+
+# Idle change-feed streams send a comment this often to keep proxies from closing them
+SSE_KEEPALIVE_SECONDS = 15
+
+# Optional periodic snapshots, e.g. SNAPSHOT_INTERVAL_MINUTES=5
+SNAPSHOT_INTERVAL_MINUTES = float(os.environ.get('SNAPSHOT_INTERVAL_MINUTES', '0'))
+
+# Only the newest snapshots are kept on disk
+SNAPSHOT_KEEP = int(os.environ.get('SNAPSHOT_KEEP', '24'))
 
 class HospitalCRUD:
     def __init__(self):
         self.query = Query()
+        self.lock = threading.RLock()
+        self.commune_centroids = load_commune_centroids(COMMUNE_CENTROIDS_PATH)
+        self.spatial_index = SpatialIndex()
+        self.suggest_index = SuggestIndex()
+        self.stats_cube = StatsCube()
+        self.doc_ids = set()
+        self.changes = ChangeLog()
+        self.snapshots = SnapshotStore(SNAPSHOTS_DIR, keep=SNAPSHOT_KEEP)
+        self._snapshot_timer = None
+        self._cache_timer = None
+        self._db = None
+        self._table = None
+    
+    @property
+    def table(self):
+        """The TinyDB hospitals table, opened on first use"""
+        self._ensure_open()
+        return self._table
+    
+    def _ensure_open(self):
+        if self._table is None:
+            self._open()
+    
+    def _open(self):
+        """Open the database and load the indexes, from the binary cache when it is fresh"""
+        with self.lock:
+            if self._table is not None:
+                return
+            self._db = TinyDB(DB_PATH)
+            self._table = self._db.table('hospitals')
+            
+            checksum = file_checksum(DB_PATH)
+            cached = load_index_cache(INDEX_CACHE_PATH, checksum)
+            if cached is not None:
+                self.spatial_index, self.suggest_index, self.stats_cube, self.doc_ids = cached
+            else:
+                self._rebuild_indexes()
+                # Give older records coordinates, whichever server opened the database
+                self.backfill_coordinates()
+                self._save_index_cache()
+    
+    def _save_index_cache(self):
+        """Write the current indexes to the cache, keyed on the database checksum"""
+        with self.lock:
+            if self._cache_timer is not None:
+                self._cache_timer.cancel()
+                self._cache_timer = None
+            save_index_cache(INDEX_CACHE_PATH, file_checksum(DB_PATH),
+                             (self.spatial_index, self.suggest_index, self.stats_cube, self.doc_ids))
+    
+    def _schedule_index_cache(self):
+        """Refresh the cache shortly after a write, so restarts after edits stay warm"""
+        with self.lock:
+            if self._cache_timer is None:
+                self._cache_timer = threading.Timer(INDEX_CACHE_SAVE_DELAY_SECONDS, self._save_index_cache)
+                self._cache_timer.daemon = True
+                self._cache_timer.start()
+    
+    def _rebuild_indexes(self):
+        """Rebuild every in-memory index from the table"""
+        with self.lock:
+            hospitals = self.table.all()
+            self.spatial_index.rebuild(hospitals)
+            self.suggest_index.rebuild(hospitals)
+            self.stats_cube.rebuild(hospitals)
+            self.doc_ids = {hospital.doc_id for hospital in hospitals}
     
-    def load_initial_data(self, json_file_path):
-        """Load initial data from JSON file"""
+    def _swap_in(self, documents):
+        """Replace the whole table with prepared documents.
+        
+        Indexes for the new state are built before taking the lock, so readers
+        only wait for the table write and a pointer swap, and never observe a
+        half-loaded table. The table is rewritten in a single storage write, so
+        there is no moment at which the file holds an empty table.
+        """
+        spatial_index = SpatialIndex()
+        spatial_index.rebuild(documents)
+        suggest_index = SuggestIndex()
+        suggest_index.rebuild(documents)
+        stats_cube = StatsCube()
+        stats_cube.rebuild(documents)
+        doc_ids = {document.doc_id for document in documents}
+        new_table = {document.doc_id: dict(document) for document in documents}
+        
+        def replace_all(table):
+            table.clear()
+            table.update(new_table)
+        
+        with self.lock:
+            self.table._update_table(replace_all)
+            # TinyDB caches the next free doc_id; make it recount
+            self.table._next_id = None
+            self.spatial_index = spatial_index
+            self.suggest_index = suggest_index
+            self.stats_cube = stats_cube
+            self.doc_ids = doc_ids
+            self.changes.append('reset')
+            self._schedule_index_cache()
+    
+    def _index_documents(self, documents):
+        """Add freshly written documents to the in-memory indexes"""
+        for document in documents:
+            self.spatial_index.add(document)
+            self.suggest_index.add(document)
+            self.stats_cube.add(document)
+            self.doc_ids.add(document.doc_id)
+    
+    def _unindex_documents(self, documents):
+        """Drop documents that are about to change or disappear from the indexes"""
+        for document in documents:
+            self.spatial_index.discard(document.doc_id)
+            self.suggest_index.discard(document)
+            self.stats_cube.discard(document)
+            self.doc_ids.discard(document.doc_id)
+    
+    def _find_documents(self, hospital_id):
+        """Return the stored documents matching a doc_id or an _id"""
+        if isinstance(hospital_id, int):
+            document = self.table.get(doc_id=hospital_id)
+            return [document] if document else []
+        return self.table.search(self.query._id == hospital_id)
+    
+    def commune_centroid(self, commune):
+        """Look up the (latitude, longitude) centroid of a commune"""
+        return self.commune_centroids.get(fold_text(commune or ''))
+    
+    def normalize_coordinates(self, hospital_data, previous=None):
+        """Validate latitude/longitude and backfill them from the commune centroid.
+        
+        When an update moves a hospital to a commune with no known centroid,
+        latitude/longitude are set to None: the stored coordinates are stale
+        and must be dropped rather than kept.
+        """
+        latitude = hospital_data.get('latitude')
+        longitude = hospital_data.get('longitude')
+        if latitude in (None, '') and longitude in (None, ''):
+            hospital_data.pop('latitude', None)
+            hospital_data.pop('longitude', None)
+        else:
+            hospital_data['latitude'], hospital_data['longitude'] = parse_coordinates(latitude, longitude)
+            return hospital_data
+        
+        # Only re-derive coordinates for an update when the commune actually moved
+        if previous is not None:
+            commune_changed = 'commune' in hospital_data and \
+                fold_text(hospital_data['commune'] or '') != fold_text(previous.get('commune', ''))
+            if not commune_changed and previous.get('latitude') is not None:
+                return hospital_data
+        
+        centroid = self.commune_centroid(hospital_data.get('commune', previous.get('commune') if previous else ''))
+        if centroid:
+            hospital_data['latitude'], hospital_data['longitude'] = centroid
+        elif previous is not None and previous.get('latitude') is not None:
+            hospital_data['latitude'] = hospital_data['longitude'] = None
+        return hospital_data
+    
+    def load_initial_data(self, json_file_path, mode='replace', delete_missing=False):
+        """Load initial data from JSON file.
+        
+        ``mode='replace'`` swaps in the file as the whole table and returns the
+        record count. ``mode='merge'`` upserts by ``_id`` and returns the
+        summary from merge_hospitals.
+        """
+        if mode not in ('replace', 'merge'):
+            return False, f"Unknown import mode: {mode}"
         try:
             with open(json_file_path, 'r', encoding='utf-8') as file:
                 data = json.load(file)
                 
-                # Clear existing data
-                hospitals_table.truncate()
-                
                 # Handle different JSON structures
                 if isinstance(data, list):
                     # If it's a list of hospitals
-                    for i, hospital in enumerate(data):
-                        if '_id' not in hospital:
-                            hospital['_id'] = f"HOSP_{i+1:04d}"
-                        hospital['created_at'] = datetime.now().isoformat()
-                    hospitals_table.insert_multiple(data)
+                    hospitals = data
                 elif isinstance(data, dict):
                     # If it's a single hospital object
-                    if '_id' not in data:
-                        data['_id'] = "HOSP_0001"
-                    data['created_at'] = datetime.now().isoformat()
-                    hospitals_table.insert(data)
+                    hospitals = [data]
+                else:
+                    hospitals = []
+                
+                if mode == 'merge':
+                    # Merging matches on _id; a positional id would overwrite an unrelated hospital
+                    missing = sum(1 for hospital in hospitals if not hospital.get('_id'))
+                    if missing:
+                        return False, f"{missing} record(s) have no _id; merge mode needs an _id on every record"
+                    return True, self.merge_hospitals(hospitals, delete_missing=delete_missing)
+                
+                for i, hospital in enumerate(hospitals):
+                    if '_id' not in hospital:
+                        hospital['_id'] = f"HOSP_{i+1:04d}"
+                
+                for hospital in hospitals:
+                    hospital['created_at'] = datetime.now().isoformat()
+                    self.normalize_coordinates(hospital)
                 
-                return True, len(data) if isinstance(data, list) else 1
+                # Build the new table off to the side, then swap it in
+                self._swap_in([Document(hospital, doc_id=i + 1) for i, hospital in enumerate(hospitals)])
+                
+                return True, len(hospitals)
         except FileNotFoundError:
             return False, f"File {json_file_path} not found"
         except json.JSONDecodeError as e:
@@ -54,28 +254,133 @@ class HospitalCRUD:
         except Exception as e:
             return False, f"Error loading data: {str(e)}"
     
+    def merge_hospitals(self, hospitals, delete_missing=False):
+        """Upsert records keyed on ``_id``, touching only those whose content changed.
+        
+        Records are compared by content hash, ignoring timestamps. Changed
+        records keep their ``created_at``. With ``delete_missing`` stored
+        records absent from ``hospitals`` are removed. The whole diff is applied
+        in a single storage write while holding the lock, so readers (and the
+        file on disk) see the table either before or after the import.
+        """
+        now = datetime.now().isoformat()
+        incoming = {}
+        for hospital in hospitals:
+            incoming[hospital['_id']] = dict(hospital)  # last occurrence wins
+        
+        with self.lock:
+            existing = {}
+            for document in self.table.all():
+                existing.setdefault(document.get('_id'), document)
+            
+            inserts, updates, unchanged = [], {}, 0
+            for hospital_id, record in incoming.items():
+                previous = existing.get(hospital_id)
+                for field in TIMESTAMP_FIELDS:
+                    record.pop(field, None)
+                self.normalize_coordinates(record, previous)
+                
+                if previous is None:
+                    record['created_at'] = record['updated_at'] = now
+                    inserts.append(record)
+                    continue
+                
+                # Coordinates kept from the stored record are not a change
+                if 'latitude' not in record and previous.get('latitude') is not None:
+                    record['latitude'] = previous['latitude']
+                    record['longitude'] = previous['longitude']
+                elif record.get('latitude', 0) is None:
+                    del record['latitude'], record['longitude']
+                if content_hash(record, TIMESTAMP_FIELDS) == content_hash(previous, TIMESTAMP_FIELDS):
+                    unchanged += 1
+                    continue
+                record['created_at'] = previous.get('created_at', now)
+                record['updated_at'] = now
+                updates[previous.doc_id] = record
+            
+            deletions = []
+            if delete_missing:
+                deletions = [document for hospital_id, document in existing.items()
+                             if hospital_id not in incoming]
+            
+            updated_previous = {doc_id: existing[record['_id']] for doc_id, record in updates.items()}
+            inserted_ids = []
+            
+            def apply_diff(table):
+                # New doc_ids come after every existing one, so none is reused within the batch
+                next_id = max(table, default=0) + 1
+                for doc_id, record in updates.items():
+                    table[doc_id] = dict(record)
+                for document in deletions:
+                    table.pop(document.doc_id, None)
+                for offset, record in enumerate(inserts):
+                    table[next_id + offset] = dict(record)
+                    inserted_ids.append(next_id + offset)
+            
+            if updates or deletions or inserts:
+                # One storage write, so a crash cannot leave a half-applied import
+                self.table._update_table(apply_diff)
+                self.table._next_id = None
+            
+            self._unindex_documents(list(updated_previous.values()) + deletions)
+            updated_documents = self.table.get(doc_ids=list(updates)) if updates else []
+            inserted_documents = self.table.get(doc_ids=inserted_ids) if inserted_ids else []
+            self._index_documents(updated_documents + inserted_documents)
+            
+            # get() returns table order, so pair old and new copies by doc_id
+            for new in updated_documents:
+                self.changes.append('update', new.doc_id, new, updated_previous[new.doc_id])
+            for document in deletions:
+                self.changes.append('delete', document.doc_id, previous=document)
+            for document in inserted_documents:
+                self.changes.append('insert', document.doc_id, document)
+            if updates or deletions or inserts:
+                self._schedule_index_cache()
+        
+        return {
+            'inserted': len(inserts),
+            'updated': len(updates),
+            'unchanged': unchanged,
+            'deleted': len(deletions)
+        }
+    
     def create_hospital(self, hospital_data):
         """Create a new hospital record"""
         # Auto-generate ID if not provided
         if '_id' not in hospital_data or not hospital_data['_id']:
-            existing_count = len(hospitals_table.all())
+            existing_count = self.count_hospitals()
             hospital_data['_id'] = f"HOSP_{existing_count + 1:04d}"
         
         hospital_data['created_at'] = datetime.now().isoformat()
         hospital_data['updated_at'] = datetime.now().isoformat()
+        self.normalize_coordinates(hospital_data)
         
-        return hospitals_table.insert(hospital_data)
+        with self.lock:
+            doc_id = self.table.insert(hospital_data)
+            document = self.table.get(doc_id=doc_id)
+            self._index_documents([document])
+            self.changes.append('insert', doc_id, document)
+            self._schedule_index_cache()
+        return doc_id
+    
+    def count_hospitals(self):
+        """Number of stored hospitals, without reading the table"""
+        self._ensure_open()
+        return len(self.doc_ids)
     
     def read_all_hospitals(self):
         """Read all hospital records"""
-        return hospitals_table.all()
+        # TinyDB shares one file handle, so reads must not interleave with writes
+        with self.lock:
+            return self.table.all()
     
     def read_hospital_by_id(self, hospital_id):
         """Read a specific hospital by ID"""
-        if isinstance(hospital_id, int):
-            return hospitals_table.get(doc_id=hospital_id)
-        else:
-            return hospitals_table.search(self.query._id == hospital_id)
+        with self.lock:
+            if isinstance(hospital_id, int):
+                return self.table.get(doc_id=hospital_id)
+            else:
+                return self.table.search(self.query._id == hospital_id)
     
     def search_hospitals(self, **kwargs):
         """Search hospitals by various criteria"""
@@ -99,52 +404,185 @@ class HospitalCRUD:
         
         return results
     
+    def suggest(self, field, prefix='', parent=None, limit=10):
+        """Typeahead suggestions for an administrative level or category"""
+        with self.lock:
+            self._ensure_open()
+            return self.suggest_index.suggest(field, prefix, parent, limit)
+    
     def update_hospital(self, hospital_id, updated_data):
         """Update a hospital record"""
         updated_data['updated_at'] = datetime.now().isoformat()
         
-        if isinstance(hospital_id, int):
-            return hospitals_table.update(updated_data, doc_ids=[hospital_id])
-        else:
-            return hospitals_table.update(updated_data, self.query._id == hospital_id)
+        with self.lock:
+            previous = self._find_documents(hospital_id)
+            if not previous:
+                return []
+            self.normalize_coordinates(updated_data, previous[0])
+            cleared = [field for field in ('latitude', 'longitude')
+                       if field in updated_data and updated_data[field] is None]
+            
+            def apply(document):
+                document.update(updated_data)
+                for field in cleared:
+                    del document[field]
+            
+            doc_ids = self.table.update(apply, doc_ids=[doc.doc_id for doc in previous])
+            updated = self.table.get(doc_ids=doc_ids)
+            self._unindex_documents(previous)
+            self._index_documents(updated)
+            for old, new in zip(previous, updated):
+                self.changes.append('update', new.doc_id, new, old)
+            self._schedule_index_cache()
+            return doc_ids
     
     def delete_hospital(self, hospital_id):
         """Delete a hospital record"""
-        if isinstance(hospital_id, int):
-            return hospitals_table.remove(doc_ids=[hospital_id])
+        with self.lock:
+            previous = self._find_documents(hospital_id)
+            if not previous:
+                return []
+            
+            doc_ids = self.table.remove(doc_ids=[doc.doc_id for doc in previous])
+            self._unindex_documents(previous)
+            for old in previous:
+                self.changes.append('delete', old.doc_id, previous=old)
+            self._schedule_index_cache()
+            return doc_ids
+    
+    def backfill_coordinates(self):
+        """Give stored hospitals without coordinates their commune centroid"""
+        def fill(document):
+            document['latitude'], document['longitude'] = self.commune_centroid(document.get('commune'))
+        
+        with self.lock:
+            # Cheap check first: every hospital is already placed
+            if len(self.spatial_index) == self.count_hospitals():
+                return 0
+            doc_ids = [doc.doc_id for doc in self.table.all()
+                       if doc.get('latitude') is None and self.commune_centroid(doc.get('commune'))]
+            if doc_ids:
+                self.table.update(fill, doc_ids=doc_ids)
+                self._rebuild_indexes()
+                self.changes.append('reset')
+                self._schedule_index_cache()
+        return len(doc_ids)
+    
+    def find_nearby(self, latitude, longitude, k=5, categories=None, radius_km=None):
+        """Find the hospitals closest to a point, nearest first"""
+        latitude, longitude = parse_coordinates(latitude, longitude)
+        with self.lock:
+            self._ensure_open()
+            matches = self.spatial_index.nearest(latitude, longitude, k=k,
+                                                 categories=categories, radius_km=radius_km)
+            documents = self.table.get(doc_ids=[doc_id for doc_id, _ in matches]) if matches else []
+        
+        by_id = {document.doc_id: document for document in documents}
+        results = []
+        for doc_id, distance_km in matches:
+            hospital = dict(by_id[doc_id])
+            hospital['distance_km'] = round(distance_km, 3)
+            results.append(hospital)
+        return results
+    
+    def take_snapshot(self, background=True):
+        """Capture a consistent copy of the table and write it to disk.
+        
+        The lock is only held while the table is read: TinyDB hands back
+        freshly parsed documents, so the copy is already private to us and
+        writers can carry on while it is serialised in the background.
+        """
+        with self.lock:
+            documents = self.table.all()
+            seq = self.changes.seq
+        
+        taken_at = datetime.now()
+        snapshot_id = f"{taken_at:%Y%m%dT%H%M%S}-{seq}"
+        payload = {
+            'id': snapshot_id,
+            'seq': seq,
+            'taken_at': taken_at.isoformat(),
+            'hospitals': {str(document.doc_id): dict(document) for document in documents}
+        }
+        
+        if background:
+            threading.Thread(target=self.snapshots.write, args=(snapshot_id, payload),
+                             name=f"snapshot-{snapshot_id}", daemon=True).start()
         else:
-            return hospitals_table.remove(self.query._id == hospital_id)
+            self.snapshots.write(snapshot_id, payload)
+        return {'id': snapshot_id, 'seq': seq, 'taken_at': payload['taken_at'], 'count': len(documents)}
+    
+    def start_snapshot_timer(self, interval_minutes):
+        """Take a snapshot every ``interval_minutes``; only the first call starts a timer.
+        
+        A tick is skipped when nothing has changed since the last snapshot,
+        and a failed write is logged without stopping the timer.
+        """
+        if interval_minutes <= 0:
+            return False
+        
+        def snapshot_loop():
+            last_seq = None
+            while True:
+                time.sleep(interval_minutes * 60)
+                if self.changes.seq == last_seq:
+                    continue
+                try:
+                    last_seq = self.take_snapshot(background=False)['seq']
+                except Exception:
+                    logging.exception("Periodic snapshot failed; retrying next interval")
+        
+        with self.lock:
+            if self._snapshot_timer is not None:
+                return False
+            self._snapshot_timer = threading.Thread(target=snapshot_loop, name='snapshot-timer', daemon=True)
+            self._snapshot_timer.start()
+        return True
+    
+    def list_snapshots(self):
+        """Available snapshots, newest first"""
+        snapshots = []
+        for snapshot_id in self.snapshots.list():
+            stamp, seq = snapshot_id.split('-')
+            snapshots.append({
+                'id': snapshot_id,
+                'seq': int(seq),
+                'taken_at': datetime.strptime(stamp, '%Y%m%dT%H%M%S').isoformat()
+            })
+        return snapshots
+    
+    def restore_snapshot(self, snapshot_id):
+        """Atomically replace the table with a snapshot, keeping its doc_ids"""
+        payload = self.snapshots.read(snapshot_id)
+        if payload is None:
+            return False, f"Snapshot {snapshot_id} not found"
+        
+        documents = [Document(hospital, doc_id=int(doc_id))
+                     for doc_id, hospital in payload['hospitals'].items()]
+        self._swap_in(documents)
+        return True, len(documents)
     
     def get_statistics(self):
         """Get comprehensive statistics about the dataset"""
-        all_hospitals = self.read_all_hospitals()
-        stats = {
-            'total_hospitals': len(all_hospitals),
-            'regions': {},
-            'categories': {},
-            'delegations': {},
-            'communes': {}
-        }
-        
-        for hospital in all_hospitals:
-            # Count by region
-            region = hospital.get('region', 'Unknown')
-            stats['regions'][region] = stats['regions'].get(region, 0) + 1
-            
-            # Count by category
-            category = hospital.get('categorie', 'Unknown')
-            stats['categories'][category] = stats['categories'].get(category, 0) + 1
-            
-            # Count by delegation
-            delegation = hospital.get('delegation', 'Unknown')
-            stats['delegations'][delegation] = stats['delegations'].get(delegation, 0) + 1
-            
-            # Count by commune
-            commune = hospital.get('commune', 'Unknown')
-            stats['communes'][commune] = stats['communes'].get(commune, 0) + 1
+        # Read from the rollup cube rather than scanning every hospital
+        with self.lock:
+            self._ensure_open()
+            stats = {
+                'total_hospitals': len(self.doc_ids),
+                'regions': self.stats_cube.totals('region'),
+                'categories': self.stats_cube.totals('categorie'),
+                'delegations': self.stats_cube.totals('delegation'),
+                'communes': self.stats_cube.totals('commune')
+            }
         
         return stats
     
+    def get_cube(self, rows, cols=None, filters=None):
+        """Cross-tab of two dimensions from the precomputed rollup cube"""
+        with self.lock:
+            self._ensure_open()
+            return self.stats_cube.query(rows, cols, filters)
+    
     def create_sample_data(self):
         """Create sample data for testing"""
         sample_hospitals = [
@@ -391,15 +829,16 @@ class HospitalCRUD:
         ]
         
         # Save sample data to file
+        os.makedirs('data', exist_ok=True)
         with open('data/sample_hospitals.json', 'w', encoding='utf-8') as f:
             json.dump(sample_hospitals, f, indent=2, ensure_ascii=False)
         
         # Load into database
-        hospitals_table.truncate()
         for hospital in sample_hospitals:
             hospital['created_at'] = datetime.now().isoformat()
             hospital['updated_at'] = datetime.now().isoformat()
-        hospitals_table.insert_multiple(sample_hospitals)
+            self.normalize_coordinates(hospital)
+        self._swap_in([Document(hospital, doc_id=i + 1) for i, hospital in enumerate(sample_hospitals)])
         
         return len(sample_hospitals)
 
@@ -410,16 +849,34 @@ hospital_crud = HospitalCRUD()
 @app.route('/')
 def index():
     """Main dashboard page"""
-    hospitals = hospital_crud.read_all_hospitals()
+    # Read the feed position first so the page cannot miss a change made while rendering
+    change_seq = hospital_crud.changes.seq
+    hospitals = with_doc_ids(hospital_crud.read_all_hospitals())
     stats = hospital_crud.get_statistics()
-    return render_template('index.html', hospitals=hospitals, stats=stats)
+    return render_template('index.html', hospitals=hospitals, stats=stats, change_seq=change_seq)
 
 # API Routes
+def with_doc_ids(hospitals):
+    """Hospitals as plain dicts carrying their doc_id, the key change-feed entries use"""
+    return [dict(hospital, doc_id=hospital.doc_id) for hospital in hospitals]
+
+def parse_cube_filter(raw_filter):
+    """Parse 'region=Casablanca-Settat,categorie=CHU' into a dict"""
+    filters = {}
+    for part in raw_filter.split(','):
+        if not part.strip():
+            continue
+        dimension, sep, value = part.partition('=')
+        if not sep or not value.strip():
+            raise ValueError(f"Invalid filter '{part}', expected dimension=value")
+        filters[dimension.strip()] = value.strip()
+    return filters
+
 @app.route('/api/hospitals', methods=['GET'])
 def get_hospitals():
     """Get all hospitals"""
     hospitals = hospital_crud.read_all_hospitals()
-    return jsonify(hospitals)
+    return jsonify(with_doc_ids(hospitals))
 
 @app.route('/api/hospitals/<hospital_id>', methods=['GET'])
 def get_hospital(hospital_id):
@@ -504,6 +961,20 @@ def search_hospitals():
         categorie=categorie,
         nom_etablissement=nom_etablissement
     )
+    return jsonify(with_doc_ids(results))
+
+@app.route('/api/suggest', methods=['GET'])
+def suggest():
+    """Typeahead for region, delegation, commune or categorie"""
+    field = request.args.get('field', 'region')
+    prefix = request.args.get('prefix', '')
+    parent = request.args.get('parent', '')
+    limit = request.args.get('limit', 10, type=int)
+    
+    try:
+        results = hospital_crud.suggest(field, prefix, parent or None, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(results)
 
 @app.route('/api/statistics', methods=['GET'])
@@ -512,7 +983,81 @@ def get_statistics():
     stats = hospital_crud.get_statistics()
     return jsonify(stats)
 
+@app.route('/api/stats/cube', methods=['GET'])
+def get_stats_cube():
+    """Pivot/drill-down over region, delegation, commune and categorie"""
+    rows = request.args.get('rows', 'region')
+    cols = request.args.get('cols', '') or None
+    try:
+        filters = parse_cube_filter(request.args.get('filter', ''))
+        return jsonify(hospital_crud.get_cube(rows, cols, filters))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """Change feed: Server-Sent Events stream, or JSON polling with ?since=<seq>"""
+    since = request.args.get('since', type=int)
+    
+    if request.accept_mimetypes.best != 'text/event-stream':
+        if since is None:
+            return jsonify({'seq': hospital_crud.changes.seq, 'changes': []})
+        changes = hospital_crud.changes.since(since)
+        seq = changes[-1]['seq'] if changes else since
+        return jsonify({'seq': seq, 'changes': changes})
+    
+    # EventSource sends Last-Event-ID when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is not None:
+        since = last_event_id
+    if since is None:
+        since = hospital_crud.changes.seq
+    
+    def stream(seq):
+        yield 'retry: 3000\n\n'
+        while True:
+            changes = hospital_crud.changes.wait(seq, timeout=SSE_KEEPALIVE_SECONDS)
+            if not changes:
+                yield ': keep-alive\n\n'
+                continue
+            for change in changes:
+                yield f"id: {change['seq']}\nevent: change\ndata: {json.dumps(change, ensure_ascii=False)}\n\n"
+            seq = changes[-1]['seq']
+    
+    return Response(stream_with_context(stream(since)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/nearby', methods=['GET'])
+def nearby_hospitals():
+    """Find the k nearest hospitals to a point or a commune"""
+    try:
+        commune = request.args.get('commune', '')
+        if commune and not request.args.get('lat'):
+            centroid = hospital_crud.commune_centroid(commune)
+            if not centroid:
+                return jsonify({'error': f'Unknown commune: {commune}'}), 404
+            latitude, longitude = centroid
+        else:
+            latitude = float(request.args['lat'])
+            longitude = float(request.args['lon'])
+        
+        k = request.args.get('k', 5, type=int)
+        radius_km = request.args.get('radius_km', type=float)
+        if radius_km is not None and request.args.get('k') is None:
+            k = None  # radius-only query returns every match inside the circle
+        categories = [c for c in request.args.get('categorie', '').split(',') if c.strip()]
+        
+        results = hospital_crud.find_nearby(latitude, longitude, k=k,
+                                            categories=categories, radius_km=radius_km)
+        return jsonify(results)
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'lat and lon must be valid coordinates: {str(e)}'}), 400
+
 # Data Management Routes
+def merge_summary_message(summary):
+    return (f"Data merged successfully! {summary['inserted']} inserted, {summary['updated']} updated, "
+            f"{summary['unchanged']} unchanged, {summary['deleted']} deleted.")
+
 @app.route('/load_data', methods=['POST'])
 def load_data():
     """Load data from uploaded JSON file"""
@@ -529,13 +1074,18 @@ def load_data():
             file_path = 'temp_upload.json'
             file.save(file_path)
             
-            # Load data into database
-            success, message = hospital_crud.load_initial_data(file_path)
+            # Load data into database; mode=merge upserts instead of replacing
+            mode = request.form.get('mode', 'replace')
+            delete_missing = request.form.get('delete_missing', '').lower() in ('1', 'true', 'yes', 'on')
+            success, message = hospital_crud.load_initial_data(file_path, mode=mode,
+                                                               delete_missing=delete_missing)
             
             # Clean up temp file
             if os.path.exists(file_path):
                 os.remove(file_path)
             
+            if success and mode == 'merge':
+                return jsonify({'message': merge_summary_message(message), 'summary': message})
             if success:
                 return jsonify({'message': f'Data loaded successfully! {message} hospitals imported.'})
             else:
@@ -560,6 +1110,32 @@ def export_data():
     hospitals = hospital_crud.read_all_hospitals()
     return jsonify(hospitals)
 
+# Snapshot Routes
+@app.route('/api/snapshots', methods=['GET'])
+def list_snapshots():
+    """List available snapshots"""
+    return jsonify(hospital_crud.list_snapshots())
+
+@app.route('/api/snapshots', methods=['POST'])
+def take_snapshot():
+    """Take a snapshot; it is written to disk in the background"""
+    try:
+        snapshot = hospital_crud.take_snapshot()
+        return jsonify({'message': 'Snapshot started', 'snapshot': snapshot}), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/snapshots/<snapshot_id>/restore', methods=['POST'])
+def restore_snapshot(snapshot_id):
+    """Swap a snapshot in as the live table"""
+    try:
+        success, message = hospital_crud.restore_snapshot(snapshot_id)
+        if success:
+            return jsonify({'message': f'Snapshot restored! {message} hospitals loaded.'})
+        return jsonify({'error': message}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -571,11 +1147,15 @@ def internal_error(error):
 
 if __name__ == '__main__':
     # Create sample data if database is empty
-    if len(hospital_crud.read_all_hospitals()) == 0:
+    if hospital_crud.count_hospitals() == 0:
         print("Creating sample data...")
         hospital_crud.create_sample_data()
         print("Sample data created!")
     
+    # The debug reloader runs this block in a watcher process too; only the serving child snapshots
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        hospital_crud.start_snapshot_timer(SNAPSHOT_INTERVAL_MINUTES)
+    
     print("🏥 Moroccan Hospitals Management System")
     print("📊 TinyDB NoSQL Database")
     print("🌐 Server starting at http://localhost:5000")
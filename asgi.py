@@ -0,0 +1,388 @@
+"""ASGI deployment mode.
+
+Serves the same routes as app.py with async handlers. Every call into
+HospitalCRUD (TinyDB file I/O and the index lock) runs on a bounded thread
+pool so slow storage work never blocks the event loop.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5002
+
+Use a single worker process: TinyDB has no cross-process locking, and the
+indexes, change feed and generated ids all live in this process's memory.
+"""
+import asyncio
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from starlette.templating import Jinja2Templates
+
+from app import (SNAPSHOT_INTERVAL_MINUTES, SSE_KEEPALIVE_SECONDS, hospital_crud, merge_summary_message,
+                 parse_cube_filter, with_doc_ids)
+
+# Threads available for blocking storage work
+STORAGE_WORKERS = int(os.environ.get('STORAGE_WORKERS', '8'))
+
+# Records serialised per chunk when streaming an export
+EXPORT_CHUNK_SIZE = 200
+
+# How often an idle change-feed stream checks for new entries
+SSE_POLL_SECONDS = 0.25
+
+storage_pool = ThreadPoolExecutor(max_workers=STORAGE_WORKERS, thread_name_prefix='storage')
+templates = Jinja2Templates(directory='templates')
+
+
+async def run_storage(func, *args, **kwargs):
+    """Run a blocking HospitalCRUD call on the storage pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(storage_pool, partial(func, *args, **kwargs))
+
+
+def error(message, status_code):
+    return JSONResponse({'error': message}, status_code=status_code)
+
+
+def parse_int(value, default=None):
+    """Integer query/header value, or ``default`` when absent or malformed (like Flask's type=int)"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_float(value, default=None):
+    """Float query value, or ``default`` when absent or malformed (like Flask's type=float)"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_hospital_id(hospital_id):
+    """Route ids are TinyDB doc_ids when numeric, `_id` values otherwise"""
+    try:
+        return int(hospital_id)
+    except ValueError:
+        return hospital_id
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+# Routes
+async def index(request):
+    """Main dashboard page"""
+    # Read the feed position first so the page cannot miss a change made while rendering
+    change_seq = hospital_crud.changes.seq
+    hospitals = with_doc_ids(await run_storage(hospital_crud.read_all_hospitals))
+    stats = await run_storage(hospital_crud.get_statistics)
+    return templates.TemplateResponse(request, 'index.html',
+                                      {'hospitals': hospitals, 'stats': stats, 'change_seq': change_seq})
+
+
+# API Routes
+async def get_hospitals(request):
+    """Get all hospitals"""
+    hospitals = await run_storage(hospital_crud.read_all_hospitals)
+    return JSONResponse(with_doc_ids(hospitals))
+
+
+async def create_hospital(request):
+    """Create new hospital"""
+    try:
+        data = await read_json(request)
+        if not data:
+            return error('No data provided', 400)
+
+        hospital_id = await run_storage(hospital_crud.create_hospital, data)
+        return JSONResponse({'message': 'Hospital created successfully', 'id': hospital_id}, status_code=201)
+    except Exception as e:
+        return error(str(e), 400)
+
+
+async def get_hospital(request):
+    """Get specific hospital"""
+    hospital_id = request.path_params['hospital_id']
+    hospital = await run_storage(hospital_crud.read_hospital_by_id, parse_hospital_id(hospital_id))
+    if not hospital and parse_hospital_id(hospital_id) != hospital_id:
+        hospital = await run_storage(hospital_crud.read_hospital_by_id, hospital_id)
+
+    if hospital:
+        return JSONResponse(hospital)
+    return error('Hospital not found', 404)
+
+
+async def update_hospital(request):
+    """Update hospital"""
+    try:
+        data = await read_json(request)
+        if not data:
+            return error('No data provided', 400)
+
+        hospital_id = parse_hospital_id(request.path_params['hospital_id'])
+        success = await run_storage(hospital_crud.update_hospital, hospital_id, data)
+        if success:
+            return JSONResponse({'message': 'Hospital updated successfully'})
+        return error('Hospital not found', 404)
+    except Exception as e:
+        return error(str(e), 400)
+
+
+async def delete_hospital(request):
+    """Delete hospital"""
+    try:
+        hospital_id = parse_hospital_id(request.path_params['hospital_id'])
+        success = await run_storage(hospital_crud.delete_hospital, hospital_id)
+        if success:
+            return JSONResponse({'message': 'Hospital deleted successfully'})
+        return error('Hospital not found', 404)
+    except Exception as e:
+        return error(str(e), 400)
+
+
+async def search_hospitals(request):
+    """Search hospitals"""
+    criteria = {
+        field: request.query_params.get(field, '')
+        for field in ('region', 'delegation', 'commune', 'categorie', 'nom_etablissement')
+    }
+    results = await run_storage(hospital_crud.search_hospitals, **criteria)
+    return JSONResponse(with_doc_ids(results))
+
+
+async def suggest(request):
+    """Typeahead for region, delegation, commune or categorie"""
+    field = request.query_params.get('field', 'region')
+    prefix = request.query_params.get('prefix', '')
+    parent = request.query_params.get('parent', '')
+    try:
+        limit = parse_int(request.query_params.get('limit'), 10)
+        results = await run_storage(hospital_crud.suggest, field, prefix, parent or None, limit)
+    except ValueError as e:
+        return error(str(e), 400)
+    return JSONResponse(results)
+
+
+async def get_statistics(request):
+    """Get dataset statistics"""
+    stats = await run_storage(hospital_crud.get_statistics)
+    return JSONResponse(stats)
+
+
+async def get_stats_cube(request):
+    """Pivot/drill-down over region, delegation, commune and categorie"""
+    rows = request.query_params.get('rows', 'region')
+    cols = request.query_params.get('cols', '') or None
+    try:
+        filters = parse_cube_filter(request.query_params.get('filter', ''))
+        cube = await run_storage(hospital_crud.get_cube, rows, cols, filters)
+    except ValueError as e:
+        return error(str(e), 400)
+    return JSONResponse(cube)
+
+
+async def get_changes(request):
+    """Change feed: Server-Sent Events stream, or JSON polling with ?since=<seq>"""
+    changes_log = hospital_crud.changes
+    since = parse_int(request.query_params.get('since'))
+
+    if 'text/event-stream' not in request.headers.get('accept', ''):
+        if since is None:
+            return JSONResponse({'seq': changes_log.seq, 'changes': []})
+        changes = changes_log.since(since)
+        seq = changes[-1]['seq'] if changes else since
+        return JSONResponse({'seq': seq, 'changes': changes})
+
+    # EventSource sends Last-Event-ID when it reconnects
+    last_event_id = parse_int(request.headers.get('last-event-id'))
+    if last_event_id is not None:
+        since = last_event_id
+    if since is None:
+        since = changes_log.seq
+
+    async def stream(seq):
+        yield 'retry: 3000\n\n'
+        idle = 0.0
+        while not await request.is_disconnected():
+            changes = changes_log.since(seq)
+            if not changes:
+                await asyncio.sleep(SSE_POLL_SECONDS)
+                idle += SSE_POLL_SECONDS
+                if idle >= SSE_KEEPALIVE_SECONDS:
+                    idle = 0.0
+                    yield ': keep-alive\n\n'
+                continue
+            idle = 0.0
+            for change in changes:
+                yield f"id: {change['seq']}\nevent: change\ndata: {json.dumps(change, ensure_ascii=False)}\n\n"
+            seq = changes[-1]['seq']
+
+    return StreamingResponse(stream(since), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def nearby_hospitals(request):
+    """Find the k nearest hospitals to a point or a commune"""
+    params = request.query_params
+    try:
+        commune = params.get('commune', '')
+        if commune and not params.get('lat'):
+            centroid = hospital_crud.commune_centroid(commune)
+            if not centroid:
+                return error(f'Unknown commune: {commune}', 404)
+            latitude, longitude = centroid
+        else:
+            latitude = float(params['lat'])
+            longitude = float(params['lon'])
+
+        k = parse_int(params.get('k'), 5)
+        radius_km = parse_float(params.get('radius_km'))
+        if radius_km is not None and params.get('k') is None:
+            k = None  # radius-only query returns every match inside the circle
+        categories = [c for c in params.get('categorie', '').split(',') if c.strip()]
+
+        results = await run_storage(hospital_crud.find_nearby, latitude, longitude, k=k,
+                                    categories=categories, radius_km=radius_km)
+        return JSONResponse(results)
+    except (KeyError, ValueError) as e:
+        return error(f'lat and lon must be valid coordinates: {str(e)}', 400)
+
+
+# Data Management Routes
+async def load_data(request):
+    """Load data from uploaded JSON file"""
+    try:
+        form = await request.form()
+        file = form.get('file')
+        if file is None or isinstance(file, str):
+            return error('No file provided', 400)
+        if file.filename == '':
+            return error('No file selected', 400)
+        if not file.filename.endswith('.json'):
+            return error('Invalid file format. Please upload a JSON file', 400)
+
+        # mode=merge upserts instead of replacing
+        mode = form.get('mode', 'replace')
+        delete_missing = str(form.get('delete_missing', '')).lower() in ('1', 'true', 'yes', 'on')
+
+        # Spool to a private temp file so concurrent uploads cannot clobber each other
+        fd, file_path = tempfile.mkstemp(suffix='.json')
+        try:
+            with os.fdopen(fd, 'wb') as target:
+                while chunk := await file.read(64 * 1024):
+                    await run_storage(target.write, chunk)
+            success, message = await run_storage(hospital_crud.load_initial_data, file_path,
+                                                 mode=mode, delete_missing=delete_missing)
+        finally:
+            os.remove(file_path)
+
+        if success and mode == 'merge':
+            return JSONResponse({'message': merge_summary_message(message), 'summary': message})
+        if success:
+            return JSONResponse({'message': f'Data loaded successfully! {message} hospitals imported.'})
+        return error(message, 400)
+    except Exception as e:
+        return error(str(e), 400)
+
+
+async def create_sample_data(request):
+    """Create sample data for testing"""
+    try:
+        count = await run_storage(hospital_crud.create_sample_data)
+        return JSONResponse({'message': f'Sample data created successfully! {count} hospitals added.'})
+    except Exception as e:
+        return error(str(e), 400)
+
+
+async def export_data(request):
+    """Export all data as JSON, streamed in chunks"""
+    hospitals = await run_storage(hospital_crud.read_all_hospitals)
+
+    async def stream():
+        # Each yield waits for the client to drain the previous chunk
+        yield '['
+        for start in range(0, len(hospitals), EXPORT_CHUNK_SIZE):
+            chunk = hospitals[start:start + EXPORT_CHUNK_SIZE]
+            prefix = ',' if start else ''
+            yield prefix + ','.join(json.dumps(hospital, ensure_ascii=False) for hospital in chunk)
+        yield ']'
+
+    return StreamingResponse(stream(), media_type='application/json')
+
+
+# Snapshot Routes
+async def list_snapshots(request):
+    """List available snapshots"""
+    snapshots = await run_storage(hospital_crud.list_snapshots)
+    return JSONResponse(snapshots)
+
+
+async def take_snapshot(request):
+    """Take a snapshot; it is written to disk in the background"""
+    try:
+        snapshot = await run_storage(hospital_crud.take_snapshot)
+        return JSONResponse({'message': 'Snapshot started', 'snapshot': snapshot}, status_code=202)
+    except Exception as e:
+        return error(str(e), 400)
+
+
+async def restore_snapshot(request):
+    """Swap a snapshot in as the live table"""
+    try:
+        success, message = await run_storage(hospital_crud.restore_snapshot,
+                                             request.path_params['snapshot_id'])
+        if success:
+            return JSONResponse({'message': f'Snapshot restored! {message} hospitals loaded.'})
+        return error(message, 404)
+    except ValueError as e:
+        return error(str(e), 400)
+
+
+# Error handlers
+async def not_found(request, exc):
+    return error('Resource not found', 404)
+
+
+async def internal_error(request, exc):
+    return error('Internal server error', 500)
+
+
+routes = [
+    Route('/', index),
+    Route('/api/hospitals', get_hospitals, methods=['GET']),
+    Route('/api/hospitals', create_hospital, methods=['POST']),
+    Route('/api/hospitals/{hospital_id}', get_hospital, methods=['GET']),
+    Route('/api/hospitals/{hospital_id}', update_hospital, methods=['PUT']),
+    Route('/api/hospitals/{hospital_id}', delete_hospital, methods=['DELETE']),
+    Route('/api/search', search_hospitals, methods=['GET']),
+    Route('/api/suggest', suggest, methods=['GET']),
+    Route('/api/statistics', get_statistics, methods=['GET']),
+    Route('/api/stats/cube', get_stats_cube, methods=['GET']),
+    Route('/api/changes', get_changes, methods=['GET']),
+    Route('/api/nearby', nearby_hospitals, methods=['GET']),
+    Route('/load_data', load_data, methods=['POST']),
+    Route('/create_sample', create_sample_data, methods=['POST']),
+    Route('/export_data', export_data, methods=['GET']),
+    Route('/api/snapshots', list_snapshots, methods=['GET']),
+    Route('/api/snapshots', take_snapshot, methods=['POST']),
+    Route('/api/snapshots/{snapshot_id}/restore', restore_snapshot, methods=['POST']),
+    Mount('/static', StaticFiles(directory='static'), name='static'),
+]
+
+app = Starlette(
+    routes=routes,
+    exception_handlers={404: not_found, 500: internal_error},
+    on_startup=[partial(hospital_crud.start_snapshot_timer, SNAPSHOT_INTERVAL_MINUTES)],
+    on_shutdown=[partial(storage_pool.shutdown, wait=False)],
+)
@@ -0,0 +1,58 @@
+import threading
+from collections import deque
+from datetime import datetime
+
+
+class ChangeLog:
+    """Bounded, sequenced log of hospital mutations.
+
+    Clients remember the last ``seq`` they applied and ask for everything
+    after it. A client that has fallen further behind than the log reaches
+    gets a single ``reset`` entry and should reload in full.
+    """
+
+    def __init__(self, max_entries=1000):
+        self._entries = deque(maxlen=max_entries)
+        self._seq = 0
+        self._condition = threading.Condition()
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def append(self, op, doc_id=None, hospital=None, previous=None):
+        """Record an insert/update/delete (or a bulk ``reset``) and wake waiters"""
+        with self._condition:
+            self._seq += 1
+            entry = {
+                'seq': self._seq,
+                'op': op,
+                'doc_id': doc_id,
+                'hospital': dict(hospital) if hospital is not None else None,
+                'previous': dict(previous) if previous is not None else None,
+                'at': datetime.now().isoformat()
+            }
+            self._entries.append(entry)
+            self._condition.notify_all()
+            return entry
+
+    def since(self, seq):
+        """Return every entry newer than ``seq``"""
+        with self._condition:
+            if seq >= self._seq:
+                # Nothing new, unless the client saw a sequence from a previous run
+                return [] if seq == self._seq else [self._reset_entry()]
+            oldest = self._entries[0]['seq'] if self._entries else self._seq + 1
+            if seq < oldest - 1:
+                return [self._reset_entry()]
+            return [entry for entry in self._entries if entry['seq'] > seq]
+
+    def wait(self, seq, timeout=None):
+        """Block until there is something newer than ``seq`` or ``timeout`` expires"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq != seq, timeout)
+            return self.since(seq)
+
+    def _reset_entry(self):
+        return {'seq': self._seq, 'op': 'reset', 'doc_id': None,
+                'hospital': None, 'previous': None, 'at': datetime.now().isoformat()}
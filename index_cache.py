@@ -0,0 +1,56 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+# Bump whenever the pickled index classes change shape
+CACHE_VERSION = 3
+
+
+def file_checksum(path):
+    """BLAKE2 digest of a file's bytes, or None if it does not exist.
+
+    Hashing the raw bytes is far cheaper than parsing the JSON they hold.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    try:
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def load_index_cache(cache_path, checksum):
+    """Return the cached payload if it was built from a source with ``checksum``"""
+    if checksum is None:
+        return None
+    try:
+        with open(cache_path, 'rb') as file:
+            cached = pickle.load(file)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if not isinstance(cached, dict):
+        return None
+    if cached.get('version') != CACHE_VERSION or cached.get('checksum') != checksum:
+        return None
+    return cached.get('payload')
+
+
+def save_index_cache(cache_path, checksum, payload):
+    """Atomically write the pre-built indexes next to their source"""
+    if checksum is None:
+        return False
+    directory = os.path.dirname(cache_path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump({'version': CACHE_VERSION, 'checksum': checksum, 'payload': payload},
+                        file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except (OSError, pickle.PicklingError, RecursionError):
+        os.remove(temp_path)
+        return False
+    return True
@@ -0,0 +1,118 @@
+"""Compare request throughput of the sync (Flask) and async (ASGI) modes.
+
+Starts each server in turn on a local port, fires a mix of API requests at
+it from concurrent clients, and prints throughput and latency percentiles.
+
+Usage:
+    python load_test.py
+    python load_test.py --mode asgi --concurrency 64 --requests 4000
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+SERVERS = {
+    'sync': [sys.executable, '-c',
+             'from app import app; app.run(host="127.0.0.1", port={port}, threaded=True)'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:app',
+             '--host', '127.0.0.1', '--port', '{port}', '--log-level', 'warning'],
+}
+
+# Read-heavy mix of what the dashboard calls, including a full export
+WORKLOAD = [
+    '/api/hospitals',
+    '/api/statistics',
+    '/api/search?region=casa',
+    '/api/suggest?field=region&prefix=r',
+    '/api/nearby?commune=Rabat&k=3',
+    '/export_data',
+]
+
+
+def wait_until_ready(base_url, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + '/api/statistics', timeout=1):
+                return True
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    return False
+
+
+def timed_request(url):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            response.read()
+        ok = True
+    except (urllib.error.URLError, ConnectionError):
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+def run_load(base_url, total_requests, concurrency):
+    urls = [base_url + WORKLOAD[i % len(WORKLOAD)] for i in range(total_requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed_request, urls))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for ok, latency in results if ok)
+    errors = sum(1 for ok, _ in results if not ok)
+
+    def percentile(p):
+        if not latencies:
+            return float('nan')
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+    return {
+        'requests': total_requests,
+        'errors': errors,
+        'seconds': elapsed,
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else float('nan'),
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+    }
+
+
+def benchmark(mode, port, total_requests, concurrency):
+    command = [part.format(port=port) for part in SERVERS[mode]]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        if not wait_until_ready(base_url):
+            raise RuntimeError(f'{mode} server did not start on port {port}')
+        run_load(base_url, min(total_requests, 50), concurrency)  # warm-up
+        return run_load(base_url, total_requests, concurrency)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=['sync', 'asgi', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--port', type=int, default=5050)
+    args = parser.parse_args()
+
+    modes = ['sync', 'asgi'] if args.mode == 'both' else [args.mode]
+    print(f"{'mode':<6}{'reqs':>7}{'errors':>8}{'req/s':>10}{'mean ms':>10}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for offset, mode in enumerate(modes):
+        result = benchmark(mode, args.port + offset, args.requests, args.concurrency)
+        print(f"{mode:<6}{result['requests']:>7}{result['errors']:>8}{result['rps']:>10.1f}"
+              f"{result['mean_ms']:>10.1f}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
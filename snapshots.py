@@ -0,0 +1,70 @@
+import json
+import os
+import re
+import tempfile
+
+# Snapshot ids are generated by us; anything else could escape the directory
+SNAPSHOT_ID_PATTERN = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9]+$')
+
+
+class SnapshotStore:
+    """Point-in-time copies of the hospitals table, one JSON file per snapshot.
+
+    With ``keep`` set, only the newest ``keep`` snapshots are retained.
+    """
+
+    def __init__(self, directory, keep=None):
+        self.directory = directory
+        self.keep = keep
+
+    def _path(self, snapshot_id):
+        if not SNAPSHOT_ID_PATTERN.match(snapshot_id):
+            raise ValueError(f"Invalid snapshot id: {snapshot_id}")
+        return os.path.join(self.directory, f"{snapshot_id}.json")
+
+    def write(self, snapshot_id, payload):
+        """Write a snapshot atomically: readers see the old file or the whole new one"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(snapshot_id)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(payload, file, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.prune()
+        return path
+
+    def prune(self):
+        """Delete all but the newest ``keep`` snapshots; returns how many were removed"""
+        if not self.keep:
+            return 0
+        stale = self.list()[self.keep:]
+        for snapshot_id in stale:
+            try:
+                os.remove(self._path(snapshot_id))
+            except FileNotFoundError:
+                pass  # already pruned by a concurrent write
+        return len(stale)
+
+    def read(self, snapshot_id):
+        """Load a snapshot payload"""
+        try:
+            with open(self._path(snapshot_id), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def list(self):
+        """Snapshot ids, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        snapshot_ids = [
+            name[:-len('.json')] for name in os.listdir(self.directory)
+            if name.endswith('.json') and SNAPSHOT_ID_PATTERN.match(name[:-len('.json')])
+        ]
+        # Timestamp first, then the numeric change seq for snapshots taken in the same second
+        return sorted(snapshot_ids, key=lambda snapshot_id: (snapshot_id[:15], int(snapshot_id[16:])),
+                      reverse=True)
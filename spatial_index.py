@@ -0,0 +1,279 @@
+import heapq
+import json
+import math
+
+from utils import fold_text
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def parse_coordinates(latitude, longitude):
+    """Validate a latitude/longitude pair and return it as floats"""
+    latitude = float(latitude)
+    longitude = float(longitude)
+    if not -90.0 <= latitude <= 90.0:
+        raise ValueError(f"Latitude out of range: {latitude}")
+    if not -180.0 <= longitude <= 180.0:
+        raise ValueError(f"Longitude out of range: {longitude}")
+    return latitude, longitude
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _unit_vector(latitude, longitude):
+    # Points live on the unit sphere so that straight-line (chord) distance
+    # orders exactly like great-circle distance, with no date-line seams.
+    phi, lam = math.radians(latitude), math.radians(longitude)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi))
+
+
+def _chord_sq_to_km(chord_sq):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord_sq) / 2))
+
+
+def _km_to_chord_sq(km):
+    angle = min(km / EARTH_RADIUS_KM, math.pi)
+    return (2 * math.sin(angle / 2)) ** 2
+
+
+def load_commune_centroids(json_file_path):
+    """Load the offline commune centroid table, keyed by accent-folded name"""
+    try:
+        with open(json_file_path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return {
+        fold_text(commune): (coords['latitude'], coords['longitude'])
+        for commune, coords in data.items()
+    }
+
+
+class KDTree:
+    """3-d tree over unit-sphere points supporting incremental insert/remove.
+
+    Nodes live in flat parallel lists (children are list positions), which
+    keeps the tree cheap to pickle into the startup cache. Removals leave
+    tombstones; the tree is rebuilt balanced once tombstones or unbalanced
+    inserts outnumber the records it was last built with, which keeps lookups
+    logarithmic at an amortised O(log n) cost per mutation.
+
+    Many hospitals share their commune centroid, so points equal to a node's
+    splitting value alternate between its two subtrees instead of piling up
+    on one side, and an insert that lands too deep triggers an early rebuild.
+    """
+
+    def __init__(self, items=()):
+        self._build(list(items))
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _build(self, items):
+        self._keys = []
+        self._points = []
+        self._axes = []
+        self._left = []
+        self._right = []
+        self._live = []
+        self._ties = []  # side the next point equal to the split value goes to
+        self._slots = {}
+        self._root = self._build_subtree(items, 0)
+        self._built_size = len(items)
+        self._dirty = 0
+
+    def _new_node(self, key, point, axis):
+        slot = len(self._keys)
+        self._keys.append(key)
+        self._points.append(point)
+        self._axes.append(axis)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._live.append(True)
+        self._ties.append(False)
+        self._slots[key] = slot
+        return slot
+
+    def _build_subtree(self, items, depth):
+        if not items:
+            return -1
+        axis = depth % 3
+        items.sort(key=lambda item: item[1][axis])
+        middle = len(items) // 2
+        key, point = items[middle]
+        slot = self._new_node(key, point, axis)
+        left = self._build_subtree(items[:middle], depth + 1)
+        right = self._build_subtree(items[middle + 1:], depth + 1)
+        self._left[slot] = left
+        self._right[slot] = right
+        return slot
+
+    def _maybe_rebuild(self, depth=0):
+        # A balanced tree is about log2(n) deep; allow generous slack before rebuilding
+        max_depth = 2 * len(self._slots).bit_length() + 8
+        if self._dirty > max(self._built_size, 16) or depth > max_depth:
+            self._build([(key, self._points[slot]) for key, slot in self._slots.items()])
+
+    def insert(self, key, point):
+        if key in self._slots:
+            self.remove(key)
+        depth = 0
+        if self._root == -1:
+            self._root = self._new_node(key, point, 0)
+        else:
+            parent = self._root
+            while True:
+                depth += 1
+                axis = self._axes[parent]
+                split = self._points[parent][axis]
+                if point[axis] == split:
+                    # Either side keeps the search invariant; alternate to stay balanced
+                    go_right = self._ties[parent]
+                    self._ties[parent] = not go_right
+                else:
+                    go_right = point[axis] > split
+                children = self._right if go_right else self._left
+                if children[parent] == -1:
+                    children[parent] = self._new_node(key, point, (axis + 1) % 3)
+                    break
+                parent = children[parent]
+        self._dirty += 1
+        self._maybe_rebuild(depth)
+
+    def remove(self, key):
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return False
+        self._live[slot] = False
+        self._dirty += 1
+        self._maybe_rebuild()
+        return True
+
+    def nearest(self, point, k=None, max_chord_sq=math.inf):
+        """Return up to ``k`` (chord_sq, key) pairs within ``max_chord_sq``, closest first"""
+        if k is not None and k <= 0:
+            return []
+        heap = []  # max-heap on distance via negated keys
+
+        def bound():
+            if k is not None and len(heap) >= k:
+                return -heap[0][0]
+            return max_chord_sq
+
+        # Explicit stack of (slot, squared distance to its half-space) so that
+        # a degenerate tree cannot exhaust the recursion limit
+        stack = [(self._root, 0.0)]
+        while stack:
+            slot, plane_dist_sq = stack.pop()
+            if slot == -1 or plane_dist_sq > bound():
+                continue
+            node_point = self._points[slot]
+            if self._live[slot]:
+                dist_sq = sum((a - b) ** 2 for a, b in zip(point, node_point))
+                if dist_sq <= bound():
+                    heapq.heappush(heap, (-dist_sq, self._keys[slot]))
+                    if k is not None and len(heap) > k:
+                        heapq.heappop(heap)
+            axis = self._axes[slot]
+            diff = point[axis] - node_point[axis]
+            if diff < 0:
+                near, far = self._left[slot], self._right[slot]
+            else:
+                near, far = self._right[slot], self._left[slot]
+            # The near side is pushed last so it is searched first
+            stack.append((far, max(plane_dist_sq, diff * diff)))
+            stack.append((near, plane_dist_sq))
+
+        return sorted((-neg_dist, key) for neg_dist, key in heap)
+
+
+class SpatialIndex:
+    """Nearest-hospital lookups, with one KD-tree per categorie plus a global one"""
+
+    ALL = None
+
+    def __init__(self):
+        self._trees = {}
+        self._entries = {}  # doc_id -> folded categorie
+
+    def __len__(self):
+        return len(self._entries)
+
+    def rebuild(self, hospitals):
+        """Rebuild every tree from scratch"""
+        self._entries = {}
+        grouped = {self.ALL: []}
+        for hospital in hospitals:
+            entry = self._entry_for(hospital)
+            if entry is None:
+                continue
+            point, category = entry
+            self._entries[hospital.doc_id] = category
+            grouped[self.ALL].append((hospital.doc_id, point))
+            grouped.setdefault(category, []).append((hospital.doc_id, point))
+        self._trees = {category: KDTree(items) for category, items in grouped.items()}
+
+    def add(self, hospital):
+        """Index (or re-index) a single stored hospital document"""
+        self.discard(hospital.doc_id)
+        entry = self._entry_for(hospital)
+        if entry is None:
+            return
+        point, category = entry
+        self._entries[hospital.doc_id] = category
+        for tree_key in (self.ALL, category):
+            self._trees.setdefault(tree_key, KDTree()).insert(hospital.doc_id, point)
+
+    def discard(self, doc_id):
+        """Drop a document from the index if it is present"""
+        category = self._entries.pop(doc_id, None)
+        if category is None:
+            return
+        for tree_key in (self.ALL, category):
+            tree = self._trees.get(tree_key)
+            if tree is not None:
+                tree.remove(doc_id)
+
+    def nearest(self, latitude, longitude, k=5, categories=None, radius_km=None):
+        """Return ``(doc_id, distance_km)`` pairs sorted by distance.
+
+        ``k=None`` returns every match inside ``radius_km``. ``categories`` is an
+        iterable of categorie names; matches from each tree are merged.
+        """
+        point = _unit_vector(latitude, longitude)
+        max_chord_sq = _km_to_chord_sq(radius_km) if radius_km is not None else math.inf
+        if categories:
+            tree_keys = {fold_text(category) for category in categories}
+        else:
+            tree_keys = {self.ALL}
+
+        matches = []
+        for tree_key in tree_keys:
+            tree = self._trees.get(tree_key)
+            if tree is not None:
+                matches.extend(tree.nearest(point, k, max_chord_sq))
+        matches.sort()
+        if k is not None:
+            matches = matches[:k]
+        return [(doc_id, _chord_sq_to_km(chord_sq)) for chord_sq, doc_id in matches]
+
+    @staticmethod
+    def _entry_for(hospital):
+        latitude = hospital.get('latitude')
+        longitude = hospital.get('longitude')
+        if latitude is None or longitude is None:
+            return None
+        try:
+            latitude, longitude = parse_coordinates(latitude, longitude)
+        except (TypeError, ValueError):
+            return None
+        category = fold_text(hospital.get('categorie', ''))
+        return _unit_vector(latitude, longitude), category
@@ -0,0 +1,164 @@
+from utils import fold_text
+
+# Administrative levels, each one nested inside the previous
+HIERARCHY = ('region', 'delegation', 'commune')
+DIMENSIONS = HIERARCHY + ('categorie',)
+
+# Stand-in for missing values, matching get_statistics
+UNKNOWN = 'Unknown'
+
+# Key of the all-categories total kept in every cell
+ALL = None
+
+
+class _Cell:
+    __slots__ = ('name', 'counts', 'children')
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = {}  # folded categorie (or ALL) -> count
+        self.children = {}  # folded child name -> _Cell
+
+
+class StatsCube:
+    """Hospital counts over region → delegation → commune, crossed with categorie.
+
+    Every node of the administrative tree keeps its own categorie histogram,
+    so any roll-up, drill-down or pivot reads precomputed cells at one level
+    of the tree instead of scanning hospitals. Adding or removing a hospital
+    touches one node per level.
+    """
+
+    def __init__(self):
+        self._root = _Cell(None)
+        self._categories = {}  # folded categorie -> display name
+
+    def rebuild(self, hospitals):
+        """Rebuild the cube from scratch"""
+        self._root = _Cell(None)
+        self._categories = {}
+        for hospital in hospitals:
+            self.add(hospital)
+
+    @staticmethod
+    def _value(hospital, dimension):
+        value = str(hospital.get(dimension) or '').strip()
+        return value or UNKNOWN
+
+    def add(self, hospital):
+        """Count a stored document"""
+        categorie = self._value(hospital, 'categorie')
+        category_key = fold_text(categorie)
+        self._categories.setdefault(category_key, categorie)
+
+        cell = self._root
+        self._bump(cell, category_key, 1)
+        for dimension in HIERARCHY:
+            name = self._value(hospital, dimension)
+            cell = cell.children.setdefault(fold_text(name), _Cell(name))
+            self._bump(cell, category_key, 1)
+
+    def discard(self, hospital):
+        """Uncount a document that has been changed or removed"""
+        category_key = fold_text(self._value(hospital, 'categorie'))
+        path = [self._root]
+        for dimension in HIERARCHY:
+            child = path[-1].children.get(fold_text(self._value(hospital, dimension)))
+            if child is None:
+                return
+            path.append(child)
+
+        for cell in path:
+            self._bump(cell, category_key, -1)
+        # Prune branches that no longer hold any hospital
+        for parent, child in zip(reversed(path[:-1]), reversed(path[1:])):
+            if not child.counts:
+                del parent.children[fold_text(child.name)]
+        if category_key not in self._root.counts:
+            self._categories.pop(category_key, None)
+
+    @staticmethod
+    def _bump(cell, category_key, delta):
+        for key in (category_key, ALL):
+            count = cell.counts.get(key, 0) + delta
+            if count > 0:
+                cell.counts[key] = count
+            else:
+                cell.counts.pop(key, None)
+
+    def _cells(self, depth, filters):
+        """Yield (path_names, cell) for every cell ``depth`` levels down that passes the filters"""
+        level = [((), self._root)]
+        for index in range(depth):
+            wanted = filters.get(HIERARCHY[index])
+            next_level = []
+            for names, cell in level:
+                if wanted is not None:
+                    child = cell.children.get(fold_text(wanted))
+                    children = [child] if child is not None else []
+                else:
+                    children = cell.children.values()
+                next_level.extend((names + (child.name,), child) for child in children)
+            level = next_level
+        return level
+
+    def query(self, rows, cols=None, filters=None):
+        """Pivot the cube: counts of ``rows`` × ``cols`` under ``filters``.
+
+        ``rows`` and ``cols`` are dimension names (``cols`` may be None).
+        ``filters`` maps dimensions to values; hierarchy filters pick a branch
+        to drill into, a categorie filter restricts the counts.
+        """
+        filters = dict(filters or {})
+        dimensions = [rows] + ([cols] if cols else [])
+        for dimension in dimensions + list(filters):
+            if dimension not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension: {dimension}")
+        if cols == rows:
+            raise ValueError("rows and cols must be different dimensions")
+
+        levels = [HIERARCHY.index(d) + 1 for d in dimensions + list(filters) if d in HIERARCHY]
+        depth = max(levels, default=0)
+
+        wanted_category = filters.get('categorie')
+        if wanted_category is not None:
+            category_keys = [fold_text(wanted_category)]
+        else:
+            category_keys = [key for key in self._root.counts if key is not ALL]
+
+        cells = {}
+        for names, cell in self._cells(depth, filters):
+            if 'categorie' in dimensions:
+                counts = [(self._categories[key], cell.counts[key])
+                          for key in category_keys if key in cell.counts]
+            else:
+                key = category_keys[0] if wanted_category is not None else ALL
+                counts = [(None, cell.counts[key])] if key in cell.counts else []
+            for categorie, count in counts:
+                labels = [categorie if d == 'categorie' else names[HIERARCHY.index(d)] for d in dimensions]
+                row_label = labels[0]
+                col_label = labels[1] if cols else 'total'
+                row = cells.setdefault(row_label, {})
+                row[col_label] = row.get(col_label, 0) + count
+
+        row_totals = {row: sum(values.values()) for row, values in cells.items()}
+        col_totals = {}
+        for values in cells.values():
+            for col, count in values.items():
+                col_totals[col] = col_totals.get(col, 0) + count
+
+        return {
+            'rows': rows,
+            'cols': cols,
+            'filter': filters,
+            'row_labels': sorted(cells, key=fold_text),
+            'col_labels': sorted(col_totals, key=fold_text),
+            'cells': cells,
+            'row_totals': row_totals,
+            'col_totals': col_totals,
+            'total': sum(row_totals.values())
+        }
+
+    def totals(self, dimension):
+        """Flat ``{value: count}`` for one dimension"""
+        return self.query(dimension)['row_totals']
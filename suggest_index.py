@@ -0,0 +1,90 @@
+from bisect import bisect_left, insort
+
+from utils import fold_text
+
+# Administrative levels, each one nested inside the previous
+HIERARCHY = ('region', 'delegation', 'commune')
+SUGGEST_FIELDS = HIERARCHY + ('categorie',)
+
+
+class SuggestIndex:
+    """Typeahead over the region → delegation → commune hierarchy.
+
+    Every (field, parent) pair owns a sorted list of accent-folded names, so a
+    prefix lookup is two bisections. Reference counts let documents be added
+    and removed one at a time without rebuilding the lists.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._display = {}
+        self._sorted = {}
+
+    def rebuild(self, hospitals):
+        """Rebuild the hierarchy from scratch"""
+        self._counts = {}
+        self._display = {}
+        self._sorted = {}
+        for hospital in hospitals:
+            self.add(hospital)
+
+    @staticmethod
+    def _paths(hospital):
+        """Yield (field, parent_key, name) for every level a document touches"""
+        parent = None
+        for field in HIERARCHY:
+            name = str(hospital.get(field) or '').strip()
+            if not name:
+                break
+            yield field, parent, name
+            parent = fold_text(name)
+        categorie = str(hospital.get('categorie') or '').strip()
+        if categorie:
+            yield 'categorie', None, categorie
+
+    def add(self, hospital):
+        """Count a stored document in the hierarchy"""
+        for field, parent, name in self._paths(hospital):
+            folded = fold_text(name)
+            # Each name is listed under its parent and in the field-wide list
+            for bucket in {(field, parent), (field, None)}:
+                key = bucket + (folded,)
+                count = self._counts.get(key, 0)
+                self._counts[key] = count + 1
+                if count == 0:
+                    self._display[key] = name
+                    insort(self._sorted.setdefault(bucket, []), folded)
+
+    def discard(self, hospital):
+        """Forget a document that has been changed or removed"""
+        for field, parent, name in self._paths(hospital):
+            folded = fold_text(name)
+            for bucket in {(field, parent), (field, None)}:
+                key = bucket + (folded,)
+                count = self._counts.get(key, 0)
+                if count > 1:
+                    self._counts[key] = count - 1
+                elif count == 1:
+                    del self._counts[key]
+                    del self._display[key]
+                    names = self._sorted[bucket]
+                    del names[bisect_left(names, folded)]
+                    if not names:
+                        del self._sorted[bucket]
+
+    def suggest(self, field, prefix='', parent=None, limit=10):
+        """Return ``{'value', 'count'}`` entries under ``parent`` starting with ``prefix``"""
+        if field not in SUGGEST_FIELDS:
+            raise ValueError(f"Unsupported field: {field}")
+        bucket = (field, fold_text(parent) if parent else None)
+        names = self._sorted.get(bucket, [])
+        prefix = fold_text(prefix or '')
+
+        start = bisect_left(names, prefix)
+        results = []
+        for folded in names[start:]:
+            if not folded.startswith(prefix) or (limit is not None and len(results) >= limit):
+                break
+            key = bucket + (folded,)
+            results.append({'value': self._display[key], 'count': self._counts[key]})
+        return results
@@ -2,7 +2,9 @@ import json
 import os
 import csv
 import datetime
+import hashlib
 import logging
+import unicodedata
 
 
 def log_action(action):
@@ -18,6 +20,20 @@ def print_divider():
     print("=" * 60)
 
 
+def fold_text(value):
+    """Lower-case a value and strip its accents so 'Fès' matches 'fes'."""
+    normalized = unicodedata.normalize('NFKD', str(value))
+    folded = ''.join(c for c in normalized if not unicodedata.combining(c))
+    return folded.casefold().strip()
+
+
+def content_hash(record, ignore=()):
+    """Stable digest of a record's fields, skipping bookkeeping keys in ``ignore``."""
+    content = {key: value for key, value in record.items() if key not in ignore}
+    encoded = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=16).hexdigest()
+
+
 def load_hospitals():
     """Load hospital data from a JSON file."""
     try: